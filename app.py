@@ -1,7 +1,10 @@
 # app.py - Global CO2 Emissions Dashboard
 
+import os
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 
 st.set_page_config(layout="wide")
@@ -9,23 +12,109 @@ st.title("Global CO₂ Emissions Explorer 📈🌎")
 st.markdown("Visualize annual CO₂ emissions data (in million tonnes) by country and year.")
 
 # --- 1. Load Data ---
-# Uses caching to load the large dataset only once
-@st.cache_data
-def load_data():
-    # Load the CSV you downloaded to your project folder
-    DATA_URL = 'https://raw.githubusercontent.com/owid/co2-data/master/owid-co2-data.csv' # <--- CORRECT: 4 SPACES INDENTED
-    df = pd.read_csv(DATA_URL) # <--- CORRECT: 4 SPACES INDENTED
-    
-    # Clean data: drop rows missing CO2 emissions and select relevant columns
-    df = df.dropna(subset=['co2', 'co2_per_capita', 'year', 'iso_code'])
+# Aggregate regions in the OWID data that should not be shown as countries
+REGIONS_TO_EXCLUDE = frozenset(['World', 'Asia', 'Europe', 'North America', 'South America', 'International transport', 'Micronesia (country)'])
+
+# Time-series Y-axis choices as (label, column) pairs, built once per process rather than per rerun
+VARIABLE_OPTIONS = (
+    ("Annual CO₂ Emissions (Million Tonnes)", "co2"),
+    ("Population (Total)", "population"),
+    ("GDP (Total)", "gdp"),
+    ("CO₂ Per GDP (Carbon Intensity)", "co2_per_gdp"),
+    ("Share of Global CO₂ (%)", "share_global_co2"),
+)
+VARIABLE_LABELS = tuple(label for label, _ in VARIABLE_OPTIONS)
+VARIABLE_COLUMNS = dict(VARIABLE_OPTIONS)
+
+# Parquet file produced by convert_data.py
+DATA_PATH = 'owid-co2-data.parquet'
+
+# Uses caching to load the large dataset only once; persisted to disk so it survives restarts.
+# data_version (the Parquet file's mtime) is part of the cache key, so re-running convert_data.py invalidates it
+@st.cache_data(persist="disk", max_entries=1, show_spinner=False)
+def load_data(data_version):
+    # Load the Parquet file, reading only the columns the dashboard uses
+    df = pd.read_parquet(
+        DATA_PATH,
+        columns=['country', 'year', 'co2', 'co2_per_capita', 'iso_code', 'population', 'gdp',
+                 'co2_per_gdp', 'cumulative_co2', 'coal_co2', 'oil_co2', 'gas_co2', 'share_global_co2'],
+        engine='pyarrow'
+    )
+
+    # Clean data: drop rows missing CO2 emissions, using a direct notna() mask instead of dropna()
+    mask = df['co2'].notna() & df['co2_per_capita'].notna() & df['year'].notna() & df['iso_code'].notna()
+    df = df.loc[mask]
     
-    # Filter out global regions (e.g., World, Africa) to keep only individual countries
-    regions_to_exclude = ['World', 'Asia', 'Europe', 'North America', 'South America', 'International transport', 'Micronesia (country)']
-    df = df[~df['country'].isin(regions_to_exclude)]
+    # Filter out global regions (e.g., World, Africa) to keep only individual countries.
+    # 'country' is made categorical so the filter (and later isin calls) compares integer codes, not strings
+    df['country'] = df['country'].astype('category')
+    excluded_codes = df['country'].cat.categories.isin(REGIONS_TO_EXCLUDE)
+    df = df[~excluded_codes[df['country'].cat.codes.values]]
+    df['country'] = df['country'].cat.remove_unused_categories()
+    # Sort the categories once here so the country list can be read straight off the dtype
+    df['country'] = df['country'].cat.reorder_categories(sorted(df['country'].cat.categories), ordered=True)
+
+    # Downcast numeric columns to halve memory; float32 is plenty of precision for the charts
+    df['year'] = df['year'].astype('int16')
+    float_cols = ['co2', 'co2_per_capita', 'co2_per_gdp', 'share_global_co2', 'coal_co2', 'oil_co2', 'gas_co2', 'cumulative_co2', 'gdp']
+    df[float_cols] = df[float_cols].astype('float32')
+
+    # Sort by year so each year's rows form one contiguous block that can be found by binary search
+    df = df.sort_values('year', kind='stable').reset_index(drop=True)
+
+    # First and last year (the ends of the sorted column), used for the slider range and the caption
+    year_range = (int(df['year'].iat[0]), int(df['year'].iat[-1]))
+
+    # Long-format fuel breakdown for the stacked bar chart, melted once instead of on every interaction
+    fuels_long = df.melt(
+        id_vars=['country', 'year'],
+        value_vars=['coal_co2', 'oil_co2', 'gas_co2'],
+        var_name='Fuel Type',
+        value_name='CO2 Emissions (Million Tonnes)'
+    )
+    fuels_long['Fuel Type'] = pd.Categorical(fuels_long['Fuel Type'], categories=['coal_co2', 'oil_co2', 'gas_co2'])
     
-    return df
+    return df, fuels_long, year_range
+
+# Boolean mask of rows whose 'country' is in the given list, compared on category codes instead of strings
+def country_mask(df, countries):
+    cats = df['country'].cat.categories
+    sel_codes = np.flatnonzero(cats.isin(countries))
+    return np.isin(df['country'].cat.codes.values, sel_codes)
+
+# Map column, label and color scale for each comparison mode
+def map_settings(mode):
+    if mode == 'Total Annual CO₂':
+        return 'co2', 'Total CO₂ (Million Tonnes)', px.colors.sequential.Reds
+    # co2_per_capita exists in the data; use a different color scale for visual distinction
+    return 'co2_per_capita', 'CO₂ Per Capita (Tonnes)', px.colors.sequential.Plasma
+
+# The map figure is shared across reruns and sessions, keyed on (data_version, year, mode).
+# _data is not hashed; data_version (the Parquet mtime) stands in for it in the cache key.
+# Returns None when there is no data for the year.
+@st.cache_resource(max_entries=64, show_spinner=False)
+def build_map(_data, data_version, year, mode):
+    map_variable_column, map_variable_label, map_color_scale = map_settings(mode)
+    # The data is sorted by year, so the selected year is a contiguous slice (empty if the year has no rows)
+    year_arr = _data['year'].values
+    lo = np.searchsorted(year_arr, year, 'left')
+    hi = np.searchsorted(year_arr, year, 'right')
+    map_data = _data.iloc[lo:hi]
+    if map_data.empty:
+        return None
+
+    # Create a Choropleth Map (Geospatial Visualization), passing only the three columns it uses
+    return px.choropleth(
+        map_data[['iso_code', map_variable_column, 'country']],
+        locations="iso_code",
+        color=map_variable_column,       # 2. Use the dynamic column
+        hover_name="country",
+        color_continuous_scale=map_color_scale, # 3. Use the dynamic color scale
+        title=map_variable_label,
+    )
 
-data = load_data()
+data_version = os.path.getmtime(DATA_PATH)
+data, fuels_long, (min_year, max_year) = load_data(data_version)
 
 # --- 2. Sidebar Filters ---
 with st.sidebar:
@@ -61,8 +150,6 @@ with st.sidebar:
     st.markdown("---") # Add a separator for clarity
     
     # Filter 1: Year Slider
-    min_year = int(data['year'].min())
-    max_year = int(data['year'].max())  
     selected_year = st.slider(
         "Select Year for Map",
         min_value=min_year,
@@ -72,43 +159,27 @@ with st.sidebar:
     )
 
     # Filter 2: Select a Country (for the Line Chart)
-    country_list = sorted(data['country'].unique())
+    country_list = data['country'].cat.categories.tolist() # Already sorted in load_data()
     selected_countries = st.multiselect(
         "Select Countries for Time-Series Chart",
         options=country_list,
         default=['United States', 'China', 'India']
     )
     # Filter 3: Select Y-Axis Variable for Chart
-    variable_options = {
-        "Annual CO₂ Emissions (Million Tonnes)": "co2",
-        "Population (Total)": "population",
-        "GDP (Total)": "gdp",
-        "CO₂ Per GDP (Carbon Intensity)": "co2_per_gdp",
-        "Share of Global CO₂ (%)": "share_global_co2",
-    }
     selected_variable_label = st.selectbox(
         "Select Variable for Time-Series Y-Axis",
-        options=list(variable_options.keys()),
+        options=VARIABLE_LABELS,
         index=0 # Default to CO2
     )
     # Get the column name from the label
-    selected_variable_column = variable_options[selected_variable_label]
+    selected_variable_column = VARIABLE_COLUMNS[selected_variable_label]
 
 # Set the dynamic variable based on the radio button choice
-if comparison_mode == 'Total Annual CO₂':
-    map_variable_column = 'co2'
-    map_variable_label = 'Total CO₂ (Million Tonnes)'
-    map_color_scale = px.colors.sequential.Reds
-else:
-    map_variable_column = 'co2_per_capita' # This column exists in the CSV
-    map_variable_label = 'CO₂ Per Capita (Tonnes)'
-    map_color_scale = px.colors.sequential.Plasma # Use a different color scale for visual distinction
+map_variable_column, map_variable_label, map_color_scale = map_settings(comparison_mode)
     
 # --- 3. Apply Filters ---
-# Filter data for the map based on the selected year
-map_data = data[data['year'] == selected_year]
 # Filter data for the line chart based on selected countries
-line_chart_data = data[data['country'].isin(selected_countries)]
+line_chart_data = data.iloc[country_mask(data, selected_countries)]
 
 
 # --- 4. Visualizations ---
@@ -117,18 +188,9 @@ col1, col2 = st.columns(2)
 with col1:
     st.subheader(f"Global {map_variable_label} in {selected_year}")
     
-    if not map_data.empty:
-        # Create a Choropleth Map (Geospatial Visualization)
-        fig_map = px.choropleth(
-            map_data,
-            locations="iso_code",
-            color=map_variable_column,       # 2. Use the dynamic column
-            hover_name="country",
-            color_continuous_scale=map_color_scale, # 3. Use the dynamic color scale
-            title=map_variable_label,
-        )
-        # ... (rest of the map code remains the same)
-        st.plotly_chart(fig_map, use_container_width=True)
+    fig_map = build_map(data, data_version, selected_year, comparison_mode)
+    if fig_map is not None:
+        st.plotly_chart(fig_map, use_container_width=True, key="map")
 
 
 with col2:
@@ -142,13 +204,15 @@ with col2:
             y=selected_variable_column,  # Use the selected column name
             color='country',        # Use a different color for each country
             title=f'{selected_variable_label} Trend',
-        labels={
-        selected_variable_column: selected_variable_label, # Use the full label for the axis
-        'year': 'Year'
-    }
-)
+            labels={
+                selected_variable_column: selected_variable_label, # Use the full label for the axis
+                'year': 'Year'
+            },
+            category_orders={'country': selected_countries}, # Pin trace/colour order to the selection, matching the fuel facets
+            render_mode='webgl',    # Scattergl traces stay fast when many countries are selected
+        )
         fig_line.update_layout(height=450, margin={"r":0,"t":40,"l":0,"b":0})
-        st.plotly_chart(fig_line, use_container_width=True)
+        st.plotly_chart(fig_line, use_container_width=True, key="line")
     else:
         st.warning("Select one or more countries in the sidebar to view the time-series trend.")
 
@@ -156,13 +220,12 @@ with col2:
 st.markdown("---")
 st.subheader("Fossil Fuel CO₂ Breakdown Over Time for Selected Countries")
 
-# Data preparation: select only the required columns and melt the DataFrame for Plotly
-melted_data = line_chart_data.melt(
-    id_vars=['country', 'year'],
-    value_vars=['coal_co2', 'oil_co2', 'gas_co2'],
-    var_name='Fuel Type',
-    value_name='CO2 Emissions (Million Tonnes)'
-)
+# Data preparation: filter the pre-melted fuel data to the selected countries
+melted_data = fuels_long.iloc[country_mask(fuels_long, selected_countries)]
+# Order facets by the selection order and pre-sort so Plotly's per-facet grouping sees contiguous rows
+melted_data = melted_data.assign(
+    country=pd.Categorical(melted_data['country'], categories=selected_countries, ordered=True)
+).sort_values(['country', 'year'], kind='stable')
 
 if not melted_data.empty:
     # Create the Stacked Bar Chart
@@ -184,7 +247,7 @@ if not melted_data.empty:
     fig_bar.update_layout(height=450, margin={"t":50, "b":0})
     fig_bar.update_yaxes(matches=None) # Allow y-axes to scale independently for comparison
 
-    st.plotly_chart(fig_bar, use_container_width=True)
+    st.plotly_chart(fig_bar, use_container_width=True, key="fuel_bar")
 else:
     st.warning("Select countries in the sidebar to view the fossil fuel breakdown.")
 
@@ -0,0 +1,13 @@
+# convert_data.py - One-shot conversion of the OWID CSV to Parquet
+# Run this once (outside of Streamlit) whenever owid-co2-data.csv is refreshed:
+#     python convert_data.py
+
+import pandas as pd
+
+CSV_PATH = 'owid-co2-data.csv'
+PARQUET_PATH = 'owid-co2-data.parquet'
+
+if __name__ == '__main__':
+    # Snappy-compressed Parquet keeps typed binary columns, so the app can skip CSV parsing
+    pd.read_csv(CSV_PATH).to_parquet(PARQUET_PATH, compression='snappy', engine='pyarrow')
+    print(f"Wrote {PARQUET_PATH}")